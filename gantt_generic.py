@@ -7,13 +7,27 @@ Exports: HTML, PowerPoint (PPTX), Word (DOCX), CSV, SVG
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import io
-import html
-import subprocess
-import tempfile
+import functools
 import os
 import json
+from dataclasses import dataclass
+import re
+import itertools
+import openpyxl
+import jinja2
+from pptx import Presentation
+from pptx.util import Inches, Pt
+from pptx.dml.color import RGBColor
+from pptx.enum.shapes import MSO_SHAPE
+from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
+from docx import Document
+from docx.shared import Inches as DocxInches, Pt as DocxPt, RGBColor as DocxRGB
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
 
 st.set_page_config(page_title="Gantt Generic", page_icon="📊", layout="wide")
 
@@ -27,63 +41,179 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def parse_date(date_val):
-    if pd.isna(date_val): return None
-    if isinstance(date_val, datetime): return date_val
-    if isinstance(date_val, pd.Timestamp): return date_val.to_pydatetime()
-    if isinstance(date_val, str):
-        for fmt in ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d.%m.%Y"]:
-            try: return datetime.strptime(date_val.strip(), fmt)
-            except: pass
-    return None
+DATE_FORMATS = {
+    # ISO: heure et fuseau horaire optionnels ("2025-03-01", "2025-03-01T09:00:00Z")
+    "%Y-%m-%d": re.compile(r"\d{4}-\d{1,2}-\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?$"),
+    "%d/%m/%Y": re.compile(r"\d{1,2}/\d{1,2}/\d{4}$"),
+    "%d-%m-%Y": re.compile(r"\d{1,2}-\d{1,2}-\d{4}$"),
+    "%Y/%m/%d": re.compile(r"\d{4}/\d{1,2}/\d{1,2}$"),
+    "%d.%m.%Y": re.compile(r"\d{1,2}\.\d{1,2}\.\d{4}$"),
+}
+
+
+def to_naive(v, fmt=None):
+    # utc=True: une valeur avec fuseau horaire ne fait pas échouer toute la colonne
+    return pd.to_datetime(v, format=fmt, utc=True, errors='coerce').dt.tz_localize(None)
 
 
-def find_column(df, names):
-    cols = {c.lower().strip(): c for c in df.columns}
+def parse_dates(s):
+    if isinstance(s.dtype, pd.DatetimeTZDtype): return s.dt.tz_convert(None)
+    if pd.api.types.is_datetime64_any_dtype(s): return s
+    # Une seule analyse par valeur distincte (beaucoup de tâches partagent les mêmes dates)
+    codes, uniques = pd.factorize(s)
+    u = pd.Series(uniques, dtype=object)
+    # Seuls les objets datetime et les chaînes d'un format connu sont acceptés: le reste
+    # (nombres, dates partielles comme "2025-03" ou "20250301") devient NaT
+    is_dt = u.map(lambda v: isinstance(v, datetime))
+    parts = [to_naive(u[is_dt])] if is_dt.any() else []
+    # Chaînes (formats mélangés dans la colonne): chaque chaîne est aiguillée par regex
+    # vers son format, puis une seule passe vectorisée par format
+    txt = u[u.map(lambda v: isinstance(v, str))].str.strip()
+    for fmt, rx in DATE_FORMATS.items():
+        if txt.empty: break
+        hit = txt.str.match(rx)
+        if hit.any():
+            parts.append(to_naive(txt[hit], 'ISO8601' if fmt == "%Y-%m-%d" else fmt))
+            txt = txt[~hit]
+    d = pd.concat(parts) if parts else pd.Series(dtype='datetime64[ns]')
+    return d.reindex(codes).set_axis(s.index)
+
+
+def find_column(cols, names):
     for n in names:
         if n.lower() in cols: return cols[n.lower()]
     return None
 
 
-def load_data(uploaded_file):
+def read_table(f, name, nrows=None, usecols=None, dtype=None):
+    ext = os.path.splitext(name)[1].lower()
+    # usecols/dtype: CSV uniquement (un classeur Excel est lu une seule fois, en entier)
+    if ext == '.csv': return pd.read_csv(f, nrows=nrows, usecols=usecols, dtype=dtype)
     try:
-        df = pd.read_csv(uploaded_file) if uploaded_file.name.endswith('.csv') else pd.read_excel(uploaded_file, engine='openpyxl')
+        return pd.read_excel(f, engine='calamine', nrows=nrows)
+    except (ImportError, ValueError):
+        # python-calamine absent (ou pandas < 2.2): repli sur xlrd / openpyxl
+        f.seek(0)
+        if ext == '.xls': return pd.read_excel(f, engine='xlrd', nrows=nrows)
+        # Lecture en flux (read_only) au lieu de charger tout le classeur en mémoire
+        wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, ())
+            cols = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+            return pd.DataFrame(list(itertools.islice(rows, nrows)), columns=cols)
+        finally:
+            wb.close()
+
+
+# Garde-fou: au-delà, le fichier est refusé plutôt que de saturer la mémoire du serveur
+MAX_ROWS = 100_000
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_bytes(file_bytes, name):
+    try:
+        # CSV: en-tête seul d'abord (lecture peu coûteuse), puis uniquement les quatre colonnes utiles.
+        # Excel: calamine analyse tout le classeur même avec nrows=0, il n'est donc lu qu'une fois.
+        csv = os.path.splitext(name)[1].lower() == '.csv'
+        df = None if csv else read_table(io.BytesIO(file_bytes), name, nrows=MAX_ROWS + 1)
+        header = read_table(io.BytesIO(file_bytes), name, nrows=0).columns if csv else df.columns
+        cols = {str(c).lower().strip(): c for c in header}
         mapping = {
-            'categorie': find_column(df, ['catégorie', 'categorie', 'category', 'groupe', 'group']),
-            'tache': find_column(df, ['tâche', 'tache', 'task', 'nom', 'name', 'activité']),
-            'debut': find_column(df, ['début', 'debut', 'start', 'date_debut', 'start_date']),
-            'fin': find_column(df, ['fin', 'end', 'date_fin', 'end_date', 'échéance'])
+            'categorie': find_column(cols, ['catégorie', 'categorie', 'category', 'groupe', 'group']),
+            'tache': find_column(cols, ['tâche', 'tache', 'task', 'nom', 'name', 'activité']),
+            'debut': find_column(cols, ['début', 'debut', 'start', 'date_debut', 'start_date']),
+            'fin': find_column(cols, ['fin', 'end', 'date_fin', 'end_date', 'échéance'])
         }
         missing = [k for k, v in mapping.items() if not v]
         if missing: return None, f"Colonnes manquantes: {', '.join(missing)}"
-        
+        # Catégorie et tâche en dtype string: un seul strip, les cellules vides restent NA
+        text = {mapping['categorie']: 'string', mapping['tache']: 'string'}
+        if csv:
+            df = read_table(io.BytesIO(file_bytes), name, nrows=MAX_ROWS + 1, usecols=sorted({header.get_loc(c) for c in mapping.values()}), dtype=text)
+        else:
+            df = df[list(dict.fromkeys(mapping.values()))].astype(text)
+        if len(df) > MAX_ROWS: return None, f"Fichier trop volumineux: {MAX_ROWS} lignes maximum"
         data = pd.DataFrame({
-            'categorie': df[mapping['categorie']].astype(str).str.strip(),
-            'tache': df[mapping['tache']].astype(str).str.strip(),
-            'debut': df[mapping['debut']].apply(parse_date),
-            'fin': df[mapping['fin']].apply(parse_date)
+            'categorie': df[mapping['categorie']].str.strip().fillna('nan'),
+            'tache': df[mapping['tache']].str.strip(),
+            'debut': parse_dates(df[mapping['debut']]),
+            'fin': parse_dates(df[mapping['fin']])
         })
-        data = data.dropna(subset=['debut', 'fin'])
-        data = data[data['tache'].notna() & (data['tache'] != '') & (data['tache'] != 'nan')]
+        data = data[data['tache'].fillna('').ne('') & data['debut'].notna() & data['fin'].notna()]
         data['duree_jours'] = (data['fin'] - data['debut']).dt.days + 1
         data = data.sort_values(['categorie', 'debut']).reset_index(drop=True)
+        # Peu de catégories distinctes: dtype category pour les groupby et le coloriage
+        data['categorie'] = data['categorie'].astype('category')
         return (data, None) if len(data) > 0 else (None, "Aucune donnée valide")
     except Exception as e:
         return None, str(e)
 
 
-def colors(n):
-    palette = ["#4e79a7", "#f28e2b", "#e15759", "#76b7b2", "#59a14f", "#edc948", "#b07aa1", "#ff9da7", "#9c755f", "#bab0ac"]
-    return [palette[i % len(palette)] for i in range(n)]
+def load_data(uploaded_file):
+    # Clé de cache = contenu du fichier: les reruns Streamlit ne relisent pas l'Excel
+    return load_bytes(uploaded_file.getvalue(), uploaded_file.name)
+
+
+PALETTE = ("#4e79a7", "#f28e2b", "#e15759", "#76b7b2", "#59a14f", "#edc948", "#b07aa1", "#ff9da7", "#9c755f", "#bab0ac")
+
+
+def color_at(i): return PALETTE[i % len(PALETTE)]
+
+
+# Même table que html.escape(quote=True), appliquée en une seule passe
+ESC_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'})
 
 
-def esc(t): return html.escape(str(t))
+def esc(t): return str(t).translate(ESC_TABLE)
 
 
-def generate_svg(data, title="Diagramme de Gantt"):
+def bar_geometry(data, mind, dr, x0, width, min_w):
+    # Décalages en jours entiers puis position/largeur de toutes les barres en une passe NumPy
+    so = (data['debut'] - mind).dt.days.to_numpy()
+    du = (data['fin'] - data['debut']).dt.days.to_numpy() + 1
+    return x0 + (so / dr) * width, np.maximum(min_w, (du / dr) * width)
+
+
+def task_columns(data):
+    # Colonnes des tâches en listes Python, dates formatées une fois par colonne (JJ/MM/AAAA)
+    return (data['tache'].tolist(), data['debut'].dt.strftime('%d/%m/%Y').tolist(),
+            data['fin'].dt.strftime('%d/%m/%Y').tolist(), data['duree_jours'].tolist())
+
+
+def quantize(a):
+    # Coordonnées arrondies au dixième, sans ".0" superflu: SVG plus léger à transférer et à parser
+    return [int(v) if v.is_integer() else v for v in np.round(a, 1).tolist()]
+
+
+@dataclass(slots=True)
+class SvgCtx:
+    """Échelle de temps, marge des libellés et couleurs partagées entre plusieurs graphiques (SVG et canvas)."""
+    mind: pd.Timestamp
+    maxd: pd.Timestamp
+    dr: int
+    max_task_len: int
+    cmap: dict
+
+    @classmethod
+    def from_data(cls, data):
+        mind, maxd = data['debut'].min(), data['fin'].max()
+        cats = pd.unique(data['categorie'])
+        return cls(mind, maxd, max(1, (maxd - mind).days), int(data['tache'].str.len().max()), {c: color_at(i) for i, c in enumerate(cats)})
+
+
+# Au-delà, les barres d'une même couleur sont regroupées en un seul <path> (sans infobulle ni coins arrondis)
+SVG_BATCH_MIN_TASKS = 500
+
+
+# Une entrée par catégorie + le global: borne plus large que les autres caches
+@st.cache_data(show_spinner=False, max_entries=128)
+def generate_svg(data, title="Diagramme de Gantt", ctx=None):
     if len(data) == 0: return "<svg><text>Aucune donnée</text></svg>"
+    # Sans contexte fourni, l'échelle et les couleurs sont calculées sur data
+    if ctx is None: ctx = SvgCtx.from_data(data)
     
-    ml = min(500, max(250, data['tache'].str.len().max() * 8 + 50))
+    ml = min(500, max(250, ctx.max_task_len * 8 + 50))
     mr, mt, mb = 50, 100, 80
     lh, bh, rs = 18, 24, 12
     rh = lh + bh + rs
@@ -93,238 +223,364 @@ def generate_svg(data, title="Diagramme de Gantt"):
     cw = 800
     tw, th = ml + cw + mr, mt + ch + mb
     
-    mind, maxd = data['debut'].min(), data['fin'].max()
-    dr = max(1, (maxd - mind).days)
+    # ctx fixe l'échelle de l'axe; la période affichée reste celle des tâches de data
+    mind, dr = ctx.mind, ctx.dr
+    d0, d1 = data['debut'].min(), data['fin'].max()
     
-    cats = data['categorie'].unique()
-    cmap = dict(zip(cats, colors(len(cats))))
+    codes, cats = pd.factorize(data['categorie'])
+    pal = [ctx.cmap[c] for c in cats]
+    cmap = dict(zip(cats, pal))
     
-    s = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {tw} {th}" width="{tw}" height="{th}" style="font-family:Arial,sans-serif;">']
-    s.append('<defs><style>.t{font-size:22px;font-weight:bold;fill:#1f4e79}.st{font-size:13px;fill:#666}.ax{font-size:11px;fill:#555}.tl{font-size:12px;font-weight:500;fill:#333}.ta{font-size:11px;fill:#444}.dt{font-size:10px;font-weight:bold;fill:#fff}.gl{stroke:#e8e8e8;stroke-width:1}.bar{rx:4;ry:4}.lt{font-size:11px;fill:#555}</style></defs>')
-    s.append(f'<rect width="{tw}" height="{th}" fill="#fafafa"/><rect x="{ml}" y="{mt}" width="{cw}" height="{ch}" fill="#fff" stroke="#ddd"/>')
-    s.append(f'<text x="{tw/2}" y="35" text-anchor="middle" class="t">{esc(title)}</text>')
-    s.append(f'<text x="{tw/2}" y="58" text-anchor="middle" class="st">Période: {mind.strftime("%d/%m/%Y")} → {maxd.strftime("%d/%m/%Y")} ({dr}j)</text>')
-    s.append(f'<text x="{tw/2}" y="78" text-anchor="middle" class="st">{n} tâches | {len(cats)} catégories</text>')
+    buf = io.StringIO()
+    out = buf.write
+    out(f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {tw} {th}" width="{tw}" height="{th}" style="font-family:Arial,sans-serif;">\n')
+    out('<defs><style>.t{font-size:22px;font-weight:bold;fill:#1f4e79}.st{font-size:13px;fill:#666}.ax{font-size:11px;fill:#555}.tl{font-size:12px;font-weight:500;fill:#333}.ta{font-size:11px;fill:#444}.dt{font-size:10px;font-weight:bold;fill:#fff}.gl{stroke:#e8e8e8;stroke-width:1}.bar{rx:4;ry:4}.lt{font-size:11px;fill:#555}</style></defs>\n')
+    out(f'<rect width="{tw}" height="{th}" fill="#fafafa"/><rect x="{ml}" y="{mt}" width="{cw}" height="{ch}" fill="#fff" stroke="#ddd"/>\n')
+    cx = quantize([tw / 2])[0]
+    out(f'<text x="{cx}" y="35" text-anchor="middle" class="t">{esc(title)}</text>\n')
+    out(f'<text x="{cx}" y="58" text-anchor="middle" class="st">Période: {d0.strftime("%d/%m/%Y")} → {d1.strftime("%d/%m/%Y")} ({max(1, (d1 - d0).days)}j)</text>\n')
+    out(f'<text x="{cx}" y="78" text-anchor="middle" class="st">{n} tâches | {len(cats)} catégories</text>\n')
     
     ng = min(10, max(4, dr // 30))
-    for i in range(ng + 1):
-        x = ml + (i / ng) * cw
-        s.append(f'<line x1="{x}" y1="{mt}" x2="{x}" y2="{mt + ch}" class="gl"/>')
+    for i, x in enumerate(quantize(ml + np.arange(ng + 1) / ng * cw)):
+        out(f'<line x1="{x}" y1="{mt}" x2="{x}" y2="{mt + ch}" class="gl"/>\n')
         gd = mind + timedelta(days=int(i * dr / ng))
-        s.append(f'<text x="{x}" y="{mt + ch + 18}" text-anchor="middle" class="ax">{gd.strftime("%d/%m/%y")}</text>')
+        out(f'<text x="{x}" y="{mt + ch + 18}" text-anchor="middle" class="ax">{gd.strftime("%d/%m/%y")}</text>\n')
     
-    cc = None
-    for idx, (_, r) in enumerate(data.iterrows()):
-        ry = mt + idx * rh
-        ly, by = ry + lh - 4, ry + lh + 2
-        s.append(f'<line x1="{ml}" y1="{ry + rh}" x2="{ml + cw}" y2="{ry + rh}" class="gl"/>')
-        
-        so = (r['debut'] - mind).days
-        du = (r['fin'] - r['debut']).days + 1
-        bx = ml + (so / dr) * cw
-        bw = max(8, (du / dr) * cw)
-        col = cmap[r['categorie']]
-        
-        if r['categorie'] != cc:
-            cc = r['categorie']
-            s.append(f'<rect x="5" y="{ly - 10}" width="8" height="8" fill="{col}" rx="2"/>')
-        
-        s.append(f'<text x="{ml - 12}" y="{by + bh/2 + 4}" text-anchor="end" class="tl">{esc(r["tache"])}</text>')
-        s.append(f'<text x="{bx + 4}" y="{ly}" class="ta">{esc(r["categorie"])} | {r["debut"].strftime("%d/%m")} → {r["fin"].strftime("%d/%m/%y")}</text>')
-        
-        tip = f'{r["tache"]}\n{r["categorie"]}\n{r["debut"].strftime("%d/%m/%Y")} → {r["fin"].strftime("%d/%m/%Y")}\n{r["duree_jours"]}j'
-        s.append(f'<rect x="{bx}" y="{by}" width="{bw}" height="{bh}" fill="{col}" class="bar"><title>{esc(tip)}</title></rect>')
-        if bw > 35:
-            s.append(f'<text x="{bx + bw/2}" y="{by + bh/2 + 4}" text-anchor="middle" class="dt">{r["duree_jours"]}j</text>')
+    # Géométrie des barres calculée en bloc (NumPy) plutôt que ligne par ligne
+    ry = mt + np.arange(n) * rh
+    bx, bw = bar_geometry(data, mind, dr, ml, cw, 8)
+    new_cat = np.r_[True, codes[1:] != codes[:-1]].tolist()
+    # Libellés tronqués à la largeur de la marge gauche (500px max ≈ 56 caractères)
+    mc = (ml - 50) // 8
+    lbl = data['tache'].where(data['tache'].str.len() <= mc, data['tache'].str.slice(0, mc - 1) + '…')
+    # Dates JJ/MM/AAAA; les formes courtes en sont des tranches
+    taches, d0s, d1s, durees = task_columns(data)
+    # Échappement en bloc avant la boucle: une fois par tâche, une fois par catégorie distincte
+    etache = [esc(t) for t in taches]
+    elbl = [esc(t) for t in lbl.tolist()]
+    ecat = np.take([esc(c) for c in cats], codes).tolist()
+    
+    xs, ws = quantize(bx), quantize(bw)
+    bcol = np.take(pal, codes)
+    batch = n >= SVG_BATCH_MIN_TASKS
+    if batch:
+        # Un nœud DOM par couleur au lieu d'un <rect> par tâche
+        by_all = ry + lh + 2
+        for col in dict.fromkeys(pal):
+            sel = np.flatnonzero(bcol == col)
+            d = ''.join(f'M{x} {y}h{w}v{bh}h-{w}z' for x, y, w in zip(quantize(bx[sel]), by_all[sel].tolist(), quantize(bw[sel])))
+            out(f'<path fill="{col}" d="{d}"/>\n')
+    
+    def row(y, x, w, tx, mx, col, nc, t, lb, c, d0, d1, dj):
+        ly, by = y + lh - 4, y + lh + 2
+        return (f'<line x1="{ml}" y1="{y + rh}" x2="{ml + cw}" y2="{y + rh}" class="gl"/>\n'
+                + (f'<rect x="5" y="{ly - 10}" width="8" height="8" fill="{col}" rx="2"/>\n' if nc else '')
+                + f'<text x="{ml - 12}" y="{by + bh // 2 + 4}" text-anchor="end" class="tl">{lb}</text>\n'
+                + f'<text x="{tx}" y="{ly}" class="ta">{c} | {d0[:5]} → {d1[:6]}{d1[8:]}</text>\n'
+                + ('' if batch else f'<rect x="{x}" y="{by}" width="{w}" height="{bh}" fill="{col}" class="bar"><title>{t}\n{c}\n{d0} → {d1}\n{dj}j</title></rect>\n')
+                + (f'<text x="{mx}" y="{by + bh // 2 + 4}" text-anchor="middle" class="dt">{dj}j</text>\n' if w > 35 else ''))
+    
+    buf.writelines(row(*a) for a in zip(
+        ry.tolist(), xs, ws, quantize(bx + 4), quantize(bx + bw / 2), bcol.tolist(), new_cat,
+        etache, elbl, ecat, d0s, d1s, durees))
     
     ly = mt + ch + 40
-    s.append(f'<text x="{ml}" y="{ly}" style="font-size:12px;font-weight:bold;fill:#333">Légende:</text>')
+    out(f'<text x="{ml}" y="{ly}" style="font-size:12px;font-weight:bold;fill:#333">Légende:</text>\n')
     for i, (c, col) in enumerate(cmap.items()):
         xo, yo = ml + (i % 3) * 280, ly + 18 + (i // 3) * 22
         if yo < th - 10:
-            s.append(f'<rect x="{xo}" y="{yo - 9}" width="14" height="14" fill="{col}" rx="3"/><text x="{xo + 20}" y="{yo + 2}" class="lt">{esc(c)}</text>')
+            out(f'<rect x="{xo}" y="{yo - 9}" width="14" height="14" fill="{col}" rx="3"/><text x="{xo + 20}" y="{yo + 2}" class="lt">{esc(c)}</text>\n')
     
-    s.append('</svg>')
-    return '\n'.join(s)
+    out('</svg>')
+    return buf.getvalue()
 
 
-def generate_html(data, svg_by_cat, title="Rapport Gantt"):
-    cats = list(svg_by_cat.keys())
-    svg_all = generate_svg(data, "Vue d'ensemble")
-    n, avg = len(data), data['duree_jours'].mean()
-    mind, maxd = data['debut'].min().strftime('%d/%m/%Y'), data['fin'].max().strftime('%d/%m/%Y')
-    span = (data['fin'].max() - data['debut'].min()).days
-    
-    h = f'''<!DOCTYPE html><html lang="fr"><head><meta charset="UTF-8"><title>{esc(title)}</title>
-<style>*{{margin:0;padding:0;box-sizing:border-box}}body{{font-family:'Segoe UI',sans-serif;background:#f5f7fa}}
-.nav{{position:fixed;top:0;left:0;right:0;background:linear-gradient(135deg,#1f4e79,#2d6da3);padding:1rem;z-index:100}}
-.nav h1{{color:#fff;font-size:1.3rem}}.container{{max-width:1400px;margin:0 auto;padding:5rem 1rem 2rem}}
-.slide{{background:#fff;border-radius:10px;padding:2rem;margin-bottom:2rem;box-shadow:0 2px 10px rgba(0,0,0,.1)}}
-.slide h2{{color:#1f4e79;border-bottom:2px solid #e0e0e0;padding-bottom:.5rem;margin-bottom:1rem}}
-.stats{{display:grid;grid-template-columns:repeat(auto-fit,minmax(120px,1fr));gap:1rem;margin:1rem 0}}
-.stat{{background:#f0f4f8;padding:1rem;border-radius:8px;text-align:center}}
-.stat-value{{font-size:1.8rem;font-weight:bold;color:#1f4e79}}.stat-label{{font-size:.85rem;color:#666}}
-.svg-container{{overflow-x:auto;margin:1rem 0}}table{{width:100%;border-collapse:collapse}}
-th,td{{padding:.75rem;text-align:left;border-bottom:1px solid #e0e0e0}}th{{background:#f0f4f8;color:#1f4e79}}
-@media print{{.nav{{display:none}}.container{{padding-top:1rem}}}}</style></head>
-<body><nav class="nav"><h1>📊 {esc(title)}</h1></nav><div class="container">
+# Au-delà de ce nombre de tâches, le rendu SVG (un nœud DOM par élément) devient lent côté navigateur
+CANVAS_MIN_TASKS = 500
+CANVAS_HEIGHT = 700
+
+CANVAS_HTML = '''<div id="w" style="height:__H__px;overflow:auto"><div id="sp" style="position:relative"><canvas id="c" style="position:sticky;top:0;left:0;display:block"></canvas></div></div>
+<script>
+const D=__DATA__,T=__TITLE__,w=document.getElementById("w"),sp=document.getElementById("sp"),cv=document.getElementById("c"),g=cv.getContext("2d");
+// Mise en page calculée côté navigateur (mêmes marges que generate_svg)
+const n=D.t.length,mt=100,mb=80,lh=18,bh=24,rh=54,cw=800,ch=n*rh,th=mt+ch+mb;
+const ml=Math.min(500,Math.max(250,D.tl*8+50)),tw=ml+cw+50,mc=Math.floor((ml-50)/8);
+const m0=Date.parse(D.mind),p2=v=>String(v).padStart(2,"0");
+function fd(o,y){const d=new Date(m0+o*864e5),s=p2(d.getUTCDate())+"/"+p2(d.getUTCMonth()+1);return y===0?s:s+"/"+(y===2?p2(d.getUTCFullYear()%100):d.getUTCFullYear());}
+const dr=Math.max(1,D.span),bx=D.s.map(s=>ml+(s/dr)*cw),bw=D.d.map(d=>Math.max(8,(d/dr)*cw)),ng=Math.min(10,Math.max(4,Math.floor(dr/30)));
+sp.style.width=tw+"px";sp.style.height=th+"px";
+function txt(t,x,y,f,c,a){g.font=f+" Arial,sans-serif";g.fillStyle=c;g.textAlign=a||"left";g.fillText(t,x,y);}
+function hl(x1,x2,y){g.beginPath();g.moveTo(x1,y);g.lineTo(x2,y);g.stroke();}
+function draw(){
+const W=w.clientWidth,H=w.clientHeight,sx=w.scrollLeft,sy=w.scrollTop,r=window.devicePixelRatio||1;
+cv.width=W*r;cv.height=H*r;cv.style.width=W+"px";cv.style.height=H+"px";g.setTransform(r,0,0,r,-sx*r,-sy*r);
+g.fillStyle="#fafafa";g.fillRect(sx,sy,W,H);g.fillStyle="#fff";g.fillRect(ml,mt,cw,ch);g.strokeStyle="#ddd";g.strokeRect(ml,mt,cw,ch);
+txt(T,tw/2,35,"bold 22px","#1f4e79","center");
+txt("Période: "+fd(D.p0,4)+" → "+fd(D.p1,4)+" ("+Math.max(1,D.p1-D.p0)+"j)",tw/2,58,"13px","#666","center");
+txt(n+" tâches | "+D.cats.length+" catégories",tw/2,78,"13px","#666","center");
+g.strokeStyle="#e8e8e8";g.lineWidth=1;
+for(let i=0;i<=ng;i++){const x=ml+(i/ng)*cw;g.beginPath();g.moveTo(x,mt);g.lineTo(x,mt+ch);g.stroke();txt(fd(Math.trunc(i*dr/ng),2),x,mt+ch+18,"11px","#555","center");}
+// Seules les lignes visibles sont dessinées
+const i0=Math.max(0,Math.floor((sy-mt)/rh)),i1=Math.min(n,Math.ceil((sy+H-mt)/rh));
+for(let i=i0;i<i1;i++){const y=mt+i*rh,ly=y+lh-4,by=y+lh+2,t=D.t[i],col=D.colors[D.c[i]];
+g.strokeStyle="#e8e8e8";hl(ml,ml+cw,y+rh);g.fillStyle=col;
+if(i===0||D.c[i]!==D.c[i-1])g.fillRect(5,ly-10,8,8);
+txt(t.length<=mc?t:t.slice(0,mc-1)+"…",ml-12,by+bh/2+4,"500 12px","#333","right");
+txt(D.cats[D.c[i]]+" | "+fd(D.s[i],0)+" → "+fd(D.s[i]+D.d[i]-1,2),bx[i]+4,ly,"11px","#444");
+g.fillStyle=col;g.beginPath();g.roundRect(bx[i],by,bw[i],bh,4);g.fill();
+if(bw[i]>35)txt(D.j[i]+"j",bx[i]+bw[i]/2,by+bh/2+4,"bold 10px","#fff","center");}
+const ly=mt+ch+40;txt("Légende:",ml,ly,"bold 12px","#333");
+D.cats.forEach((c,i)=>{const xo=ml+(i%3)*280,yo=ly+18+Math.floor(i/3)*22;if(yo<th-10){g.fillStyle=D.colors[i];g.fillRect(xo,yo-9,14,14);txt(c,xo+20,yo+2,"11px","#555");}});
+}
+let pending=false;
+function redraw(){if(!pending){pending=true;requestAnimationFrame(()=>{pending=false;draw();});}}
+w.addEventListener("scroll",redraw);window.addEventListener("resize",redraw);
+cv.addEventListener("mousemove",e=>{const rc=cv.getBoundingClientRect(),x=e.clientX-rc.left+w.scrollLeft,y=e.clientY-rc.top+w.scrollTop,i=Math.floor((y-mt)/rh),by=mt+i*rh+lh+2;
+cv.title=i>=0&&i<n&&x>=bx[i]&&x<=bx[i]+bw[i]&&y>=by&&y<=by+bh?D.t[i]+"\\n"+D.cats[D.c[i]]+"\\n"+fd(D.s[i],4)+" → "+fd(D.s[i]+D.d[i]-1,4)+"\\n"+D.j[i]+"j":"";});
+redraw();
+</script>'''
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def gantt_layout(data, ctx=None):
+    # Données brutes par colonne (décalages en jours): la géométrie est calculée par le navigateur.
+    # Même SvgCtx que generate_svg: échelle, marge et couleurs identiques dans les deux rendus
+    if ctx is None: ctx = SvgCtx.from_data(data)
+    mind = ctx.mind
+    codes, cats = pd.factorize(data['categorie'])
+    return {
+        'mind': f'{mind:%Y-%m-%d}', 'span': ctx.dr, 'tl': ctx.max_task_len,
+        'p0': (data['debut'].min() - mind).days, 'p1': (data['fin'].max() - mind).days,
+        'cats': [str(c) for c in cats], 'colors': [ctx.cmap[c] for c in cats], 'c': codes.tolist(),
+        't': data['tache'].tolist(), 's': (data['debut'] - mind).dt.days.tolist(),
+        'd': ((data['fin'] - data['debut']).dt.days + 1).tolist(), 'j': data['duree_jours'].tolist(),
+    }
+
+
+def generate_canvas(data, title="Diagramme de Gantt", ctx=None):
+    if len(data) == 0: return "<p>Aucune donnée</p>", 40
+    h = min(CANVAS_HEIGHT, 100 + len(data) * 54 + 80)
+    # "</" échappé pour ne pas fermer la balise <script> depuis les données
+    t, d = (json.dumps(v).replace('</', '<\\/') for v in (str(title), gantt_layout(data, ctx)))
+    return CANVAS_HTML.replace('__H__', str(h)).replace('__TITLE__', t).replace('__DATA__', d), h + 10
+
+
+def svgs_by_category(groups, title, ctx=None):
+    return {c: generate_svg(g, f"{title} - {c}", ctx) for c, g in groups.items()}
+
+
+def show_chart(data, title, rendu, ctx=None):
+    # Le moteur est choisi avant toute génération: le SVG n'est construit que s'il est affiché
+    if rendu == "Canvas" or (rendu == "Auto" and len(data) >= CANVAS_MIN_TASKS):
+        h, height = generate_canvas(data, title, ctx)
+        st.iframe(h, height=height)
+    else:
+        st.markdown(f'<div class="gantt-container">{generate_svg(data, title, ctx)}</div>', unsafe_allow_html=True)
+
+
+REPORT_TEMPLATE = jinja2.Environment(autoescape=True).from_string('''<!DOCTYPE html><html lang="fr"><head><meta charset="UTF-8"><title>{{ title }}</title>
+<style>*{margin:0;padding:0;box-sizing:border-box}body{font-family:'Segoe UI',sans-serif;background:#f5f7fa}
+.nav{position:fixed;top:0;left:0;right:0;background:linear-gradient(135deg,#1f4e79,#2d6da3);padding:1rem;z-index:100}
+.nav h1{color:#fff;font-size:1.3rem}.container{max-width:1400px;margin:0 auto;padding:5rem 1rem 2rem}
+.slide{background:#fff;border-radius:10px;padding:2rem;margin-bottom:2rem;box-shadow:0 2px 10px rgba(0,0,0,.1)}
+.slide h2{color:#1f4e79;border-bottom:2px solid #e0e0e0;padding-bottom:.5rem;margin-bottom:1rem}
+.stats{display:grid;grid-template-columns:repeat(auto-fit,minmax(120px,1fr));gap:1rem;margin:1rem 0}
+.stat{background:#f0f4f8;padding:1rem;border-radius:8px;text-align:center}
+.stat-value{font-size:1.8rem;font-weight:bold;color:#1f4e79}.stat-label{font-size:.85rem;color:#666}
+.svg-container{overflow-x:auto;margin:1rem 0}table{width:100%;border-collapse:collapse}
+th,td{padding:.75rem;text-align:left;border-bottom:1px solid #e0e0e0}th{background:#f0f4f8;color:#1f4e79}
+@media print{.nav{display:none}.container{padding-top:1rem}}</style></head>
+<body><nav class="nav"><h1>📊 {{ title }}</h1></nav><div class="container">
 <div class="slide"><h2>📈 Résumé</h2><div class="stats">
-<div class="stat"><div class="stat-value">{n}</div><div class="stat-label">Tâches</div></div>
-<div class="stat"><div class="stat-value">{len(cats)}</div><div class="stat-label">Catégories</div></div>
-<div class="stat"><div class="stat-value">{avg:.0f}j</div><div class="stat-label">Durée moy.</div></div>
-<div class="stat"><div class="stat-value">{span}j</div><div class="stat-label">Période</div></div></div>
-<p style="color:#666;margin:1rem 0">Période: {mind} → {maxd}</p>
-<table><thead><tr><th>Catégorie</th><th>Tâches</th><th>Durée moy.</th></tr></thead><tbody>'''
-    
-    for c in cats:
-        cd = data[data['categorie'] == c]
-        h += f'<tr><td>{esc(c)}</td><td>{len(cd)}</td><td>{cd["duree_jours"].mean():.0f}j</td></tr>'
-    
-    h += f'</tbody></table></div><div class="slide"><h2>🗓️ Vue d\'ensemble</h2><div class="svg-container">{svg_all}</div></div>'
-    
-    for c, svg in svg_by_cat.items():
-        cd = data[data['categorie'] == c]
-        h += f'<div class="slide"><h2>{esc(c)}</h2><p style="color:#666;margin-bottom:1rem">{len(cd)} tâches | Durée moy.: {cd["duree_jours"].mean():.0f}j</p><div class="svg-container">{svg}</div></div>'
-    
-    return h + '</div></body></html>'
+<div class="stat"><div class="stat-value">{{ n }}</div><div class="stat-label">Tâches</div></div>
+<div class="stat"><div class="stat-value">{{ slides|length }}</div><div class="stat-label">Catégories</div></div>
+<div class="stat"><div class="stat-value">{{ '%.0f'|format(avg) }}j</div><div class="stat-label">Durée moy.</div></div>
+<div class="stat"><div class="stat-value">{{ span }}j</div><div class="stat-label">Période</div></div></div>
+<p style="color:#666;margin:1rem 0">Période: {{ mind }} → {{ maxd }}</p>
+<table><thead><tr><th>Catégorie</th><th>Tâches</th><th>Durée moy.</th><th>Période</th></tr></thead><tbody>
+{%- for r in stats %}<tr><td>{{ r.Index }}</td><td>{{ r.n }}</td><td>{{ '%.0f'|format(r.dur) }}j</td><td>{{ r.start.strftime('%d/%m/%Y') }} → {{ r.end.strftime('%d/%m/%Y') }}</td></tr>{% endfor -%}
+</tbody></table></div><div class="slide"><h2>🗓️ Vue d'ensemble</h2><div class="svg-container">{{ svg_all|safe }}</div></div>
+{%- for c, svg, r in slides %}<div class="slide"><h2>{{ c }}</h2><p style="color:#666;margin-bottom:1rem">{{ r.n }} tâches | Durée moy.: {{ '%.0f'|format(r.dur) }}j</p><div class="svg-container">{{ svg|safe }}</div></div>{% endfor -%}
+</div></body></html>''')
+
 
+def category_stats(data):
+    # Statistiques par catégorie en une seule passe, dans l'ordre d'apparition
+    return data.groupby('categorie', sort=False, observed=True).agg(n=('tache', 'size'), dur=('duree_jours', 'mean'), start=('debut', 'min'), end=('fin', 'max'))
 
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def generate_html(data, svg_all, svg_by_cat, title="Rapport Gantt"):
+    agg = category_stats(data)
+    mind, maxd = data['debut'].min(), data['fin'].max()
+    # Rendu par fragments encodés directement dans le tampon: pas de chaîne HTML complète intermédiaire
+    chunks = REPORT_TEMPLATE.generate(
+        title=title, n=len(data), avg=data['duree_jours'].mean(), span=(maxd - mind).days,
+        mind=mind.strftime('%d/%m/%Y'), maxd=maxd.strftime('%d/%m/%Y'), stats=agg.itertuples(),
+        svg_all=svg_all, slides=[(c, svg, agg.loc[c]) for c, svg in svg_by_cat.items()])
+    buf = io.BytesIO()
+    buf.writelines(c.encode('utf-8') for c in chunks)
+    return buf.getvalue()
+
+
+# ttl: la date "Généré le" reste au plus une heure en retard
+@st.cache_data(show_spinner=False, max_entries=4, ttl="1h")
 def gen_pptx(data, title):
-    cats = data['categorie'].unique()
-    cmap = {c: colors(len(cats))[i].replace("#", "") for i, c in enumerate(cats)}
+    agg = category_stats(data)
+    cats = agg.index
+    cmap = {c: color_at(i)[1:] for i, c in enumerate(cats)}
     mind, maxd = data['debut'].min(), data['fin'].max()
     dr = max(1, (maxd - mind).days)
     n, avg = len(data), data['duree_jours'].mean()
     
-    js = f'''const pptxgen=require("pptxgenjs");let p=new pptxgen();p.layout="LAYOUT_16x9";
-let s1=p.addSlide();s1.background={{color:"1F4E79"}};
-s1.addText({json.dumps(title)},{{x:.5,y:2,w:9,h:1,fontSize:40,color:"FFFFFF",bold:true,align:"center"}});
-s1.addText("Généré le {datetime.now().strftime('%d/%m/%Y')}",{{x:.5,y:3.2,w:9,h:.5,fontSize:16,color:"CADCFC",align:"center"}});
-s1.addText("{n} tâches | {len(cats)} catégories | {avg:.0f}j durée moyenne",{{x:.5,y:4,w:9,h:.4,fontSize:14,color:"CADCFC",align:"center"}});
-let s2=p.addSlide();s2.addText("📈 Résumé",{{x:.5,y:.3,w:9,h:.6,fontSize:28,color:"1F4E79",bold:true}});
-s2.addText("Période: {mind.strftime('%d/%m/%Y')} → {maxd.strftime('%d/%m/%Y')}",{{x:.5,y:1,w:9,h:.4,fontSize:14,color:"666666"}});
-let t=[[{{text:"Catégorie",options:{{bold:true,fill:{{color:"1F4E79"}},color:"FFFFFF"}}}},{{text:"Tâches",options:{{bold:true,fill:{{color:"1F4E79"}},color:"FFFFFF"}}}},{{text:"Durée",options:{{bold:true,fill:{{color:"1F4E79"}},color:"FFFFFF"}}}}]];
-'''
-    for c in cats:
-        cd = data[data['categorie'] == c]
-        js += f't.push([{{text:{json.dumps(c)}}},{{text:"{len(cd)}"}},{{text:"{cd["duree_jours"].mean():.0f}j"}}]);'
+    prs = Presentation()
+    prs.slide_width, prs.slide_height = Inches(10), Inches(5.625)
+    blank = prs.slide_layouts[6]
+    
+    def text(s, t, x, y, w, h, size, color, bold=False, align=None, middle=False):
+        tf = s.shapes.add_textbox(Inches(x), Inches(y), Inches(w), Inches(h)).text_frame
+        tf.word_wrap = True
+        if middle: tf.vertical_anchor = MSO_ANCHOR.MIDDLE
+        p = tf.paragraphs[0]
+        p.alignment = align
+        r = p.add_run()
+        r.text = t
+        r.font.size, r.font.bold, r.font.color.rgb = Pt(size), bold, RGBColor.from_string(color)
+    
+    def rect(s, x, y, w, h, color):
+        sh = s.shapes.add_shape(MSO_SHAPE.RECTANGLE, Inches(x), Inches(y), Inches(w), Inches(h))
+        sh.fill.solid()
+        sh.fill.fore_color.rgb = RGBColor.from_string(color)
+        sh.line.fill.background()
+    
+    s1 = prs.slides.add_slide(blank)
+    s1.background.fill.solid()
+    s1.background.fill.fore_color.rgb = RGBColor.from_string("1F4E79")
+    text(s1, title, .5, 2, 9, 1, 40, "FFFFFF", True, PP_ALIGN.CENTER)
+    text(s1, f"Généré le {datetime.now():%d/%m/%Y}", .5, 3.2, 9, .5, 16, "CADCFC", align=PP_ALIGN.CENTER)
+    text(s1, f"{n} tâches | {len(cats)} catégories | {avg:.0f}j durée moyenne", .5, 4, 9, .4, 14, "CADCFC", align=PP_ALIGN.CENTER)
     
-    js += 's2.addTable(t,{x:.5,y:1.5,w:9,h:3,fontSize:11,border:{pt:.5,color:"CCCCCC"}});'
+    s2 = prs.slides.add_slide(blank)
+    text(s2, "📈 Résumé", .5, .3, 9, .6, 28, "1F4E79", True)
+    text(s2, f"Période: {mind.strftime('%d/%m/%Y')} → {maxd.strftime('%d/%m/%Y')}", .5, 1, 9, .4, 14, "666666")
+    tbl = s2.shapes.add_table(len(agg) + 1, 3, Inches(.5), Inches(1.5), Inches(9), Inches(3)).table
+    rows = [("Catégorie", "Tâches", "Durée")] + [(cs.Index, str(cs.n), f"{cs.dur:.0f}j") for cs in agg.itertuples()]
+    for i, vals in enumerate(rows):
+        for j, v in enumerate(vals):
+            cell = tbl.cell(i, j)
+            # Run ajouté explicitement: cell.text = "" n'en crée aucun (catégorie vide après strip)
+            r = cell.text_frame.paragraphs[0].add_run()
+            r.text = v
+            r.font.size = Pt(11)
+            if i == 0:
+                r.font.bold = True
+                r.font.color.rgb = RGBColor.from_string("FFFFFF")
+                cell.fill.solid()
+                cell.fill.fore_color.rgb = RGBColor.from_string("1F4E79")
     
-    for ci, c in enumerate(cats):
-        cd = data[data['categorie'] == c].reset_index(drop=True)
+    for cs, (c, cd) in zip(agg.itertuples(), data.groupby('categorie', sort=False, observed=True)):
         col = cmap[c]
-        js += f'let s{ci+3}=p.addSlide();s{ci+3}.addShape(p.shapes.RECTANGLE,{{x:0,y:0,w:.12,h:5.625,fill:{{color:"{col}"}}}});'
-        js += f's{ci+3}.addText({json.dumps(c)},{{x:.3,y:.2,w:9,h:.5,fontSize:22,color:"1F4E79",bold:true}});'
-        js += f's{ci+3}.addText("{len(cd)} tâches | Durée moy.: {cd["duree_jours"].mean():.0f}j",{{x:.3,y:.65,w:9,h:.3,fontSize:11,color:"666666"}});'
+        s = prs.slides.add_slide(blank)
+        rect(s, 0, 0, .12, 5.625, col)
+        text(s, c, .3, .2, 9, .5, 22, "1F4E79", True)
+        text(s, f"{cs.n} tâches | Durée moy.: {cs.dur:.0f}j", .3, .65, 9, .3, 11, "666666")
         
         mx = min(12, len(cd))
         bh = min(.32, 3.8 / mx) if mx > 0 else .32
-        for i, (_, r) in enumerate(cd.head(mx).iterrows()):
+        bxs, bws = bar_geometry(cd.head(mx), mind, dr, 2.8, 6.5, .15)
+        taches, _, _, durees = task_columns(cd.head(mx))
+        for i, (t, dj, bx, bw) in enumerate(zip(taches, durees, bxs.tolist(), bws.tolist())):
             ty = 1.1 + i * (bh + .08)
-            so = (r['debut'] - mind).days
-            du = (r['fin'] - r['debut']).days + 1
-            bx = 2.8 + (so / dr) * 6.5
-            bw = max(.15, (du / dr) * 6.5)
-            tn = r['tache'][:35].replace('"', "'").replace('\\', '')
-            js += f's{ci+3}.addText("{tn}",{{x:.3,y:{ty},w:2.4,h:{bh},fontSize:9,color:"333333",valign:"middle"}});'
-            js += f's{ci+3}.addShape(p.shapes.RECTANGLE,{{x:{bx},y:{ty},w:{bw},h:{bh},fill:{{color:"{col}"}}}});'
-            js += f's{ci+3}.addText("{r["duree_jours"]}j",{{x:{bx},y:{ty},w:{bw},h:{bh},fontSize:8,color:"FFFFFF",bold:true,align:"center",valign:"middle"}});'
+            text(s, t[:35], .3, ty, 2.4, bh, 9, "333333", middle=True)
+            rect(s, bx, ty, bw, bh, col)
+            text(s, f"{dj}j", bx, ty, bw, bh, 8, "FFFFFF", True, PP_ALIGN.CENTER, True)
     
-    js += 'p.writeFile({fileName:"output.pptx"}).then(()=>console.log("OK"));'
-    return js
+    buf = io.BytesIO()
+    prs.save(buf)
+    return buf.getvalue()
 
 
+@st.cache_data(show_spinner=False, max_entries=4, ttl="1h")
 def gen_docx(data, title):
-    cats = data['categorie'].unique()
+    agg = category_stats(data)
     mind, maxd = data['debut'].min(), data['fin'].max()
     n, avg = len(data), data['duree_jours'].mean()
     span = (maxd - mind).days
     
-    js = f'''const {{Document,Packer,Paragraph,TextRun,Table,TableRow,TableCell,HeadingLevel,AlignmentType,WidthType,ShadingType,PageBreak,Header,Footer,PageNumber}}=require("docx");
-const fs=require("fs");
-const doc=new Document({{
-styles:{{default:{{document:{{run:{{font:"Arial",size:24}}}}}},paragraphStyles:[
-{{id:"Heading1",name:"Heading 1",basedOn:"Normal",run:{{size:36,bold:true,color:"1F4E79"}},paragraph:{{spacing:{{before:400,after:200}}}}}},
-{{id:"Heading2",name:"Heading 2",basedOn:"Normal",run:{{size:28,bold:true,color:"1F4E79"}},paragraph:{{spacing:{{before:300,after:150}}}}}}]}},
-sections:[{{properties:{{page:{{size:{{width:12240,height:15840}},margin:{{top:1440,right:1440,bottom:1440,left:1440}}}}}},
-headers:{{default:new Header({{children:[new Paragraph({{children:[new TextRun({{text:{json.dumps(title)},size:20,color:"666666"}})]}})]}})}},
-footers:{{default:new Footer({{children:[new Paragraph({{alignment:AlignmentType.CENTER,children:[new TextRun({{text:"Page ",size:20}}),new TextRun({{children:[PageNumber.CURRENT],size:20}})]}})]}})}},
-children:[
-new Paragraph({{heading:HeadingLevel.HEADING_1,children:[new TextRun({json.dumps(title)})]}}) ,
-new Paragraph({{children:[new TextRun({{text:"Généré le {datetime.now().strftime('%d/%m/%Y')}",italics:true,color:"666666"}})]}}),
-new Paragraph({{children:[]}}),
-new Paragraph({{heading:HeadingLevel.HEADING_2,children:[new TextRun("Résumé")]}}),
-new Paragraph({{children:[new TextRun({{text:"Tâches: ",bold:true}}),new TextRun("{n}")]}}),
-new Paragraph({{children:[new TextRun({{text:"Catégories: ",bold:true}}),new TextRun("{len(cats)}")]}}),
-new Paragraph({{children:[new TextRun({{text:"Durée moyenne: ",bold:true}}),new TextRun("{avg:.0f} jours")]}}),
-new Paragraph({{children:[new TextRun({{text:"Période: ",bold:true}}),new TextRun("{mind.strftime('%d/%m/%Y')} → {maxd.strftime('%d/%m/%Y')} ({span}j)")]}}),
-new Paragraph({{children:[]}}),
-new Paragraph({{heading:HeadingLevel.HEADING_2,children:[new TextRun("Par catégorie")]}}),
-new Table({{width:{{size:100,type:WidthType.PERCENTAGE}},rows:[
-new TableRow({{children:[
-new TableCell({{shading:{{fill:"1F4E79",type:ShadingType.CLEAR}},children:[new Paragraph({{children:[new TextRun({{text:"Catégorie",bold:true,color:"FFFFFF"}})]}})]}}),
-new TableCell({{shading:{{fill:"1F4E79",type:ShadingType.CLEAR}},children:[new Paragraph({{children:[new TextRun({{text:"Tâches",bold:true,color:"FFFFFF"}})]}})]}}),
-new TableCell({{shading:{{fill:"1F4E79",type:ShadingType.CLEAR}},children:[new Paragraph({{children:[new TextRun({{text:"Durée moy.",bold:true,color:"FFFFFF"}})]}})]}})]}}),
-'''
-    for c in cats:
-        cd = data[data['categorie'] == c]
-        js += f'new TableRow({{children:[new TableCell({{children:[new Paragraph({{children:[new TextRun({json.dumps(c)})]}})]}}),'
-        js += f'new TableCell({{children:[new Paragraph({{children:[new TextRun("{len(cd)}")]}})]}}),'
-        js += f'new TableCell({{children:[new Paragraph({{children:[new TextRun("{cd["duree_jours"].mean():.0f}j")]}})]}})]}}),\n'
+    doc = Document()
+    doc.styles['Normal'].font.name, doc.styles['Normal'].font.size = "Arial", DocxPt(12)
+    for name, size, before, after in [('Heading 1', 18, 20, 10), ('Heading 2', 14, 15, 7.5)]:
+        sty = doc.styles[name]
+        sty.font.size, sty.font.bold, sty.font.color.rgb = DocxPt(size), True, DocxRGB.from_string("1F4E79")
+        sty.paragraph_format.space_before, sty.paragraph_format.space_after = DocxPt(before), DocxPt(after)
+    sec = doc.sections[0]
+    sec.page_width, sec.page_height = DocxInches(8.5), DocxInches(11)
+    sec.top_margin = sec.right_margin = sec.bottom_margin = sec.left_margin = DocxInches(1)
     
-    js += ']}}),'
-    js += 'new Paragraph({children:[new PageBreak()]}),'
+    r = sec.header.paragraphs[0].add_run(title)
+    r.font.size, r.font.color.rgb = DocxPt(10), DocxRGB.from_string("666666")
+    p = sec.footer.paragraphs[0]
+    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    p.add_run("Page ").font.size = DocxPt(10)
+    # Numéro de page: champ PAGE (pas d'API python-docx dédiée)
+    fld = OxmlElement('w:fldSimple')
+    fld.set(qn('w:instr'), 'PAGE')
+    p._p.append(fld)
     
-    for c in cats:
-        cd = data[data['categorie'] == c]
-        js += f'new Paragraph({{heading:HeadingLevel.HEADING_2,children:[new TextRun({json.dumps(c)})]}}),'
-        js += f'new Paragraph({{children:[new TextRun({{text:"{len(cd)} tâches | Durée moy.: {cd["duree_jours"].mean():.0f}j",color:"666666"}})]}}),new Paragraph({{children:[]}}),'
-        
-        js += '''new Table({width:{size:100,type:WidthType.PERCENTAGE},rows:[
-new TableRow({children:[
-new TableCell({shading:{fill:"E8E8E8",type:ShadingType.CLEAR},children:[new Paragraph({children:[new TextRun({text:"Tâche",bold:true})]})]}),
-new TableCell({shading:{fill:"E8E8E8",type:ShadingType.CLEAR},children:[new Paragraph({children:[new TextRun({text:"Début",bold:true})]})]}),
-new TableCell({shading:{fill:"E8E8E8",type:ShadingType.CLEAR},children:[new Paragraph({children:[new TextRun({text:"Fin",bold:true})]})]}),
-new TableCell({shading:{fill:"E8E8E8",type:ShadingType.CLEAR},children:[new Paragraph({children:[new TextRun({text:"Durée",bold:true})]})]})]}),'''
-        
-        for _, r in cd.iterrows():
-            js += f'new TableRow({{children:[new TableCell({{children:[new Paragraph({{children:[new TextRun({json.dumps(r["tache"])})]}})]}}),new TableCell({{children:[new Paragraph({{children:[new TextRun("{r["debut"].strftime("%d/%m/%Y")}")]}})]}}),'
-            js += f'new TableCell({{children:[new Paragraph({{children:[new TextRun("{r["fin"].strftime("%d/%m/%Y")}")]}})]}}),'
-            js += f'new TableCell({{children:[new Paragraph({{children:[new TextRun("{r["duree_jours"]}j")]}})]}})]}}),\n'
-        
-        js += ']}),new Paragraph({children:[]}),'
+    def line(label, value):
+        p = doc.add_paragraph()
+        p.add_run(label).bold = True
+        p.add_run(value)
+    
+    def table(header, rows, fill, color=None):
+        t = doc.add_table(rows=len(rows) + 1, cols=len(header))
+        t.style = 'Table Grid'
+        for cell, h in zip(t.rows[0].cells, header):
+            r = cell.paragraphs[0].add_run(h)
+            r.bold = True
+            if color: r.font.color.rgb = DocxRGB.from_string(color)
+            shd = OxmlElement('w:shd')
+            shd.set(qn('w:val'), 'clear')
+            shd.set(qn('w:fill'), fill)
+            cell._tc.get_or_add_tcPr().append(shd)
+        for row, vals in zip(t.rows[1:], rows):
+            for cell, v in zip(row.cells, vals):
+                cell.text = v
+    
+    doc.add_heading(title, 1)
+    r = doc.add_paragraph().add_run(f"Généré le {datetime.now():%d/%m/%Y}")
+    r.italic, r.font.color.rgb = True, DocxRGB.from_string("666666")
+    doc.add_paragraph()
+    doc.add_heading("Résumé", 2)
+    line("Tâches: ", f"{n}")
+    line("Catégories: ", f"{len(agg)}")
+    line("Durée moyenne: ", f"{avg:.0f} jours")
+    line("Période: ", f"{mind.strftime('%d/%m/%Y')} → {maxd.strftime('%d/%m/%Y')} ({span}j)")
+    doc.add_paragraph()
+    doc.add_heading("Par catégorie", 2)
+    table(["Catégorie", "Tâches", "Durée moy."], [(cs.Index, str(cs.n), f"{cs.dur:.0f}j") for cs in agg.itertuples()], "1F4E79", "FFFFFF")
+    doc.add_page_break()
     
-    js += ''']}]}});
-Packer.toBuffer(doc).then(b=>{fs.writeFileSync("output.docx",b);console.log("OK")});'''
-    return js
+    for cs, (c, cd) in zip(agg.itertuples(), data.groupby('categorie', sort=False, observed=True)):
+        doc.add_heading(c, 2)
+        doc.add_paragraph().add_run(f"{cs.n} tâches | Durée moy.: {cs.dur:.0f}j").font.color.rgb = DocxRGB.from_string("666666")
+        doc.add_paragraph()
+        table(["Tâche", "Début", "Fin", "Durée"], [(t, d0, d1, f"{dj}j") for t, d0, d1, dj in zip(*task_columns(cd))], "E8E8E8")
+        doc.add_paragraph()
+    
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
 
 
-def run_node(script, ext):
-    with tempfile.TemporaryDirectory() as tmp:
-        # Créer package.json pour les dépendances locales
-        pkg = {"dependencies": {"pptxgenjs": "^3.12.0", "docx": "^8.2.0"}}
-        with open(os.path.join(tmp, "package.json"), "w") as f:
-            json.dump(pkg, f)
-        
-        # Installer les dépendances npm localement
-        try:
-            subprocess.run(["npm", "install", "--silent"], cwd=tmp, capture_output=True, timeout=120)
-        except:
-            pass
-        
-        sf = os.path.join(tmp, "gen.js")
-        of = os.path.join(tmp, f"output.{ext}")
-        with open(sf, "w", encoding="utf-8") as f:
-            f.write(script)
-        try:
-            r = subprocess.run(["node", sf], cwd=tmp, capture_output=True, text=True, timeout=60)
-            if r.returncode == 0 and os.path.exists(of):
-                with open(of, "rb") as f:
-                    return f.read()
-        except:
-            pass
-    return None
+@functools.lru_cache(maxsize=1)
+def template_bytes():
+    # Le modèle ne change jamais: généré une fois par processus, pas à chaque rerun
+    tpl = pd.DataFrame({'catégorie': ['Phase 1', 'Phase 1', 'Phase 2'], 'tâche': ['Analyse', 'Design', 'Dev'], 'début': ['2025-01-01', '2025-01-15', '2025-02-01'], 'fin': ['2025-01-14', '2025-01-31', '2025-03-15']})
+    buf = io.BytesIO()
+    tpl.to_excel(buf, index=False, engine='xlsxwriter')
+    return buf.getvalue()
 
 
 def main():
@@ -335,10 +591,7 @@ def main():
         st.header("📋 Instructions")
         st.markdown("**Colonnes:** catégorie, tâche, début, fin\n\n**Dates:** YYYY-MM-DD ou DD/MM/YYYY")
         st.divider()
-        tpl = pd.DataFrame({'catégorie': ['Phase 1', 'Phase 1', 'Phase 2'], 'tâche': ['Analyse', 'Design', 'Dev'], 'début': ['2025-01-01', '2025-01-15', '2025-02-01'], 'fin': ['2025-01-14', '2025-01-31', '2025-03-15']})
-        buf = io.BytesIO()
-        tpl.to_excel(buf, index=False, engine='openpyxl')
-        st.download_button("📥 Template", buf.getvalue(), "template.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        st.download_button("📥 Template", template_bytes(), "template.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
     
     f = st.file_uploader("📁 Fichier Excel/CSV", type=['xlsx', 'xls', 'csv'])
     
@@ -357,54 +610,40 @@ def main():
         c4.metric("Période", f"{(data['fin'].max() - data['debut'].min()).days}j")
         
         with st.expander("👁️ Données"):
-            st.dataframe(data, use_container_width=True, hide_index=True)
+            st.dataframe(data, width="stretch", hide_index=True)
         
         st.divider()
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         mode = col1.radio("Affichage", ["Global", "Par catégorie"], horizontal=True)
         title = col2.text_input("Titre", "Diagramme de Gantt")
+        rendu = col3.radio("Rendu", ["Auto", "SVG", "Canvas"], horizontal=True, help=f"Auto: Canvas à partir de {CANVAS_MIN_TASKS} tâches")
+        
+        groups = {c: g.reset_index(drop=True) for c, g in data.groupby('categorie', sort=False, observed=True)}
+        # Échelle de temps et couleurs communes: les vues par catégorie restent alignées sur la vue globale
+        svg_ctx = SvgCtx.from_data(data)
         
         st.divider()
         if mode == "Global":
-            st.markdown(f'<div class="gantt-container">{generate_svg(data, title)}</div>', unsafe_allow_html=True)
+            show_chart(data, title, rendu)
         else:
-            for cat in data['categorie'].unique():
+            for cat, g in groups.items():
                 with st.expander(cat, expanded=True):
-                    cd = data[data['categorie'] == cat].reset_index(drop=True)
-                    st.markdown(f'<div class="gantt-container">{generate_svg(cd, f"{title} - {cat}")}</div>', unsafe_allow_html=True)
+                    show_chart(g, f"{title} - {cat}", rendu, svg_ctx)
         
         st.divider()
         st.subheader("📥 Exports")
         
-        svg_cat = {c: generate_svg(data[data['categorie'] == c].reset_index(drop=True), c) for c in data['categorie'].unique()}
-        
         c1, c2, c3, c4, c5 = st.columns(5)
         
-        csv_buf = io.StringIO()
-        exp = data.copy()
-        exp['debut'] = exp['debut'].dt.strftime('%Y-%m-%d')
-        exp['fin'] = exp['fin'].dt.strftime('%Y-%m-%d')
-        exp.to_csv(csv_buf, index=False)
-        c1.download_button("📄 CSV", csv_buf.getvalue(), f"gantt_{datetime.now():%Y%m%d}.csv", "text/csv")
-        
-        c2.download_button("🖼️ SVG", generate_svg(data, title), f"gantt_{datetime.now():%Y%m%d}.svg", "image/svg+xml")
-        c3.download_button("🌐 HTML", generate_html(data, svg_cat, title), f"gantt_{datetime.now():%Y%m%d}.html", "text/html")
-        
-        if c4.button("📊 PowerPoint"):
-            with st.spinner("Génération PPTX..."):
-                pptx = run_node(gen_pptx(data, title), "pptx")
-                if pptx:
-                    st.download_button("⬇️ PPTX", pptx, f"gantt_{datetime.now():%Y%m%d}.pptx", "application/vnd.openxmlformats-officedocument.presentationml.presentation", key="dl_pptx")
-                else:
-                    st.warning("Node.js requis pour PPTX")
+        # Les exports ne sont générés qu'au clic sur le bouton de téléchargement
+        c1.download_button("📄 CSV", lambda: data.to_csv(index=False, date_format='%Y-%m-%d'), f"gantt_{datetime.now():%Y%m%d}.csv", "text/csv")
+        # generate_svg est mis en cache: le SVG global de l'affichage sert aussi aux exports SVG et HTML
+        c2.download_button("🖼️ SVG", lambda: generate_svg(data, title), f"gantt_{datetime.now():%Y%m%d}.svg", "image/svg+xml")
+        c3.download_button("🌐 HTML", lambda: generate_html(data, generate_svg(data, title), svgs_by_category(groups, title, svg_ctx), title), f"gantt_{datetime.now():%Y%m%d}.html", "text/html")
         
-        if c5.button("📝 Word"):
-            with st.spinner("Génération DOCX..."):
-                docx = run_node(gen_docx(data, title), "docx")
-                if docx:
-                    st.download_button("⬇️ DOCX", docx, f"gantt_{datetime.now():%Y%m%d}.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", key="dl_docx")
-                else:
-                    st.warning("Node.js requis pour DOCX")
+        # Date de génération passée en argument: elle fait partie de la clé de cache des exports PPTX/DOCX
+        c4.download_button("📊 PowerPoint", lambda: gen_pptx(data, title), f"gantt_{datetime.now():%Y%m%d}.pptx", "application/vnd.openxmlformats-officedocument.presentationml.presentation")
+        c5.download_button("📝 Word", lambda: gen_docx(data, title), f"gantt_{datetime.now():%Y%m%d}.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
     else:
         st.info("👆 Chargez un fichier pour commencer")
         with st.expander("🎯 Démo", expanded=True):